@@ -17,10 +17,13 @@ Usage:
         python trace_function_dependency.py <target path> --module <module path>
     do not trace some dirs:
         --skip dir1 dir2 dir3
+    parse files with N processes(default is usable cpu count):
+        --jobs N
 
 Example:
     python trace_function_dependency.py . --function foo
     python trace_function_dependency.py . --module foo.py  --skip /dir1 /dir2
+    python trace_function_dependency.py . --function foo --json-compact
 
 -----------------------------
 Output format:
@@ -58,36 +61,87 @@ Output format:
 
 
 import os
+import sys
 import argparse
 import ast
 import json
 import logging as log
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 
-SKIP = []
+SKIP = ()
+
+# normalized filepath -> ast.Module, or None if unparsable
+_parse_cache = {}
 
 
 class File():
     """
     Attributes:
         filepath: A string of filepath.
-        import_list: A list store all import name or asname in a file.
+        import_list: A frozenset store all import name or asname in a file.
+        stem: A string of filename without extension.
     """
-    def __init__(self, filepath, import_list=[]):
-        self.filepath = filepath
-        self.import_list = import_list
+    __slots__ = ('filepath', 'import_list', 'stem')
+
+    def __init__(self, filepath, import_list=None):
+        self.filepath = sys.intern(filepath)
+        self.stem = get_stem_in_filepath(filepath)
+        self.import_list = frozenset() if import_list is None else frozenset(import_list)
+
+
+# Handlers used by Node.get_call_name_in_ast, keyed by exact ast node type.
+# A handler adds the name of the node if any, and returns the next node to
+# visit, None when the full name is found, or _UNPARSED.
+_UNPARSED = object()
+
+
+def _add_attribute_name(value, names):
+    names.append(value.attr)
+    return value.value
+
+
+def _add_call_name(value, names):
+    return value.func
+
+
+def _add_subscript_name(value, names):
+    return value.value
 
 
-class Node(object):
+def _add_constant_name(value, names):
+    if not isinstance(value.value, str):
+        return _UNPARSED
+
+    names.append(value.value)
+    return None
+
+
+def _add_name_name(value, names):
+    names.append(value.id)
+    return None
+
+
+_CALL_NAME_HANDLERS = {
+    ast.Attribute: _add_attribute_name,
+    ast.Call: _add_call_name,
+    ast.Subscript: _add_subscript_name,
+    ast.Constant: _add_constant_name,
+    ast.Name: _add_name_name,
+}
+
+
+class Node():
     """
     Every object in AST(abstract syntax tree) is a node. Node is used as
     class, function or call here.
 
     Attributes:
-        node: A ast.Node object.
-        names: A list store class, function and call name. The names in front are
+        lineno: A int of line number of the ast node, None for root.
+        names: A tuple store class, function and call name. The names in front are
                parent class or function. The names behind are child function or
-               call. e.g. [foo, outerfunction, innerfunction, bar] is
+               call. e.g. (foo, outerfunction, innerfunction, bar) is
                class foo():
                    def outerfunction():
                        def innerfunction():
@@ -95,29 +149,39 @@ class Node(object):
         file: A File instance.
         parent_node: A Node instance is called in this node.
         child_nodes: A list of Node instance that call this node.
+        call_name: A string of the last name without attribute owner.
+        outermost_function_name: A string of the first name is not a class.
     """
-    def __init__(self, node, names, file, parent_node=None):
-        self.node = node
+    # One Node is created per call, slots keep them small and fast to access.
+    __slots__ = (
+        'lineno', 'names', 'file', 'parent_node', 'child_nodes',
+        'call_name', 'outermost_function_name',
+    )
+
+    def __init__(self, lineno, names, file, parent_node=None):
+        self.lineno = lineno
         self.names = names
         self.file = file
         self.parent_node = parent_node
         self.child_nodes = []
 
+        # names never change, so the derived names are computed only once
+        self.call_name = sys.intern(names[-1].rsplit('.', 1)[-1]) if names else ''
+        self.outermost_function_name = ''
+
+        for name in names:
+            if not name or not name[0].isupper():  # uppercase indicates class
+                self.outermost_function_name = name
+                break
+
         if self.parent_node:
             self.parent_node.child_nodes.append(self)
 
     def get_call_name(self):
-        return self.names[-1].split('.')[-1]
+        return self.call_name
 
     def get_outermost_function_name(self):
-        for name in self.names:
-            if name:
-                if not name[0].isupper():  # uppercase indicates class
-                    return name
-            else:
-                return name
-
-        return ''
+        return self.outermost_function_name
 
     # TODO: solve unparse call node
     @staticmethod
@@ -129,44 +193,49 @@ class Node(object):
         Attributes:
             value: A ast.Call object.
         """
+        # fast path for the most common foo() and attr.foo()
+        value_type = type(value)
+
+        if value_type is ast.Name:
+            return value.id
+        elif value_type is ast.Attribute and type(value.value) is ast.Name:
+            return value.value.id + '.' + value.attr
+
         names = []
 
-        while True:
-            if isinstance(value, ast.Attribute):
-                names.append(value.attr)
-                value = value.value
-            elif isinstance(value, ast.Call):
-                value = value.func
-            elif isinstance(value, ast.Subscript):
-                value = value.value
-            elif isinstance(value, ast.Str):
-                names.append(value.s)
-                break
-            elif isinstance(value, ast.Name):
-                names.append(value.id)
-                break
-            else:
+        while value is not None:
+            handler = _CALL_NAME_HANDLERS.get(type(value))
+            next_value = handler(value, names) if handler else _UNPARSED
+
+            if next_value is _UNPARSED:
                 log.debug('unparse: ' + str(value))
                 log.debug(filepath + ':' + str(value.lineno))
                 break
 
+            value = next_value
+
         names.reverse()
         return '.'.join(names)
 
     @staticmethod
     def get_tree(parent_node, indent_level=1):
         """To render nodes info and relation into easily readable format."""
-        tree = ''
-        indent = '    ' * indent_level
-        indent_level += 1
+        lines = []
+        stack = [(child_node, indent_level) for child_node in reversed(parent_node.child_nodes)]
 
-        for child_node in parent_node.child_nodes:
-            tree += indent + child_node.file.filepath + ':' + \
-                    str(child_node.node.lineno) + \
-                    ', ' + '::'.join(child_node.names) + '\n'
-            tree += Node.get_tree(child_node, indent_level)
+        # depth first with an explicit stack, lines are joined once at the end
+        while stack:
+            child_node, indent_level = stack.pop()
+            lines.append(
+                '    ' * indent_level + child_node.file.filepath + ':' +
+                str(child_node.lineno) + ', ' + '::'.join(child_node.names) + '\n'
+            )
+            stack.extend(
+                (grandchild_node, indent_level + 1)
+                for grandchild_node in reversed(child_node.child_nodes)
+            )
 
-        return tree
+        return ''.join(lines)
 
 
 def get_stem_in_filepath(filepath):
@@ -174,94 +243,346 @@ def get_stem_in_filepath(filepath):
     return basename.split('.')[0]
 
 
-def is_skip(path, root_abs_path):
-    # set to same root path
-    abs_path = os.path.abspath(path)
-    path = abs_path.split(root_abs_path)[1]
+def get_skip_prefixes(skip_dirs):
+    """
+    To normalize dirs/files do not want to be traced into path prefixes
+    relative to the traced root, e.g. dir1 and /dir1 are both /dir1.
+    """
+    return tuple(
+        skip_dir if skip_dir.startswith(os.sep) else os.sep + skip_dir
+        for skip_dir in skip_dirs
+    )
 
-    for skip_dir in SKIP:
-        if path.find(skip_dir) == 0:
-            return True
 
-    return False
+def is_skip(path, skip_prefixes):
+    """
+    Attributes:
+        path: A string of path relative to the traced root, starts with os.sep.
+        skip_prefixes: A tuple of path prefixes, see get_skip_prefixes.
+    """
+    return path.startswith(skip_prefixes)
+
+
+def _iter_py_files_in_dir(dirpath, skip_prefixes, root_len, ancestors):
+    """
+    Attributes:
+        ancestors: A set of (st_dev, st_ino) of dirs being traversed, a
+                   symlinked dir pointing back to one of them is a cycle.
+    """
+    with os.scandir(dirpath) as entries:
+        for entry in entries:
+            # entry.path is already joined, slice it to get the root relative path
+            if is_skip(entry.path[root_len:], skip_prefixes):
+                continue
+
+            # DirEntry reuses d_type from readdir, only dirs need a stat for
+            # the cycle check. DirEntry.stat() leaves st_ino and st_dev zero
+            # on Windows, so os.stat is used for the dir id.
+            if entry.is_dir():
+                stat = os.stat(entry.path)
+                dir_id = (stat.st_dev, stat.st_ino)
+
+                if dir_id in ancestors:
+                    log.debug('symlink cycle: ' + entry.path)
+                    continue
+
+                ancestors.add(dir_id)
+                yield from _iter_py_files_in_dir(entry.path, skip_prefixes, root_len, ancestors)
+                ancestors.remove(dir_id)
+            elif entry.name.endswith('.py') and entry.is_file():
+                yield entry.path
+
+
+def _iter_py_files(path, skip_prefixes=()):
+    """
+    To traverse path and yield every .py filepath in directory order.
+    Symlinked dirs and files are followed like real ones.
+
+    Attributes:
+        path: A string of dirpath or filepath.
+        skip_prefixes: A tuple of path prefixes, see get_skip_prefixes.
+    """
+    if os.path.isdir(path):
+        stat = os.stat(path)
+        root_len = len(path.rstrip(os.sep))
+        yield from _iter_py_files_in_dir(
+            path, skip_prefixes, root_len, {(stat.st_dev, stat.st_ino)}
+        )
+    elif path.endswith('.py') and os.path.isfile(path):
+        yield path
+
+
+def _parse(path):
+    """
+    Source is passed to ast.parse as bytes, the tokenizer handles BOM and
+    encoding declaration without a decode in Python. Type comments are not
+    used by tracing, so they are not parsed either.
+
+    Returns:
+        A ast.Module object, or None if it can not be parsed.
+    """
+    with open(path, 'rb') as f:
+        src = f.read()
+
+    try:
+        return ast.parse(src, filename=path, type_comments=False)
+    except SyntaxError:
+        log.debug('unparse: ' + path)
+        return None
+
+
+def _load(path):
+    """
+    To read and parse a program only once per run. Module mode function pass
+    caches its files here, the call pass takes them out again.
+
+    Returns:
+        A ast.Module object, or None if it can not be parsed.
+    """
+    key = os.path.normpath(path)
+
+    if key not in _parse_cache:
+        _parse_cache[key] = _parse(path)
+
+    return _parse_cache[key]
+
+
+# ast node types are never subclassed by ast.parse, so the hot loops below
+# test the exact type with one set lookup instead of an isinstance chain.
+_SCOPE_TYPES = frozenset((ast.ClassDef, ast.FunctionDef))
+_IMPORT_TYPES = frozenset((ast.Import, ast.ImportFrom))
+
+
+def _walk(ast_node):
+    """
+    Same as ast.walk, nodes are yielded in the same breadth first order.
+    Children are read from _fields inline, without a iter_child_nodes
+    generator per node.
+    """
+    AST = ast.AST
+    todo = deque([ast_node])
+    popleft = todo.popleft
+    append = todo.append
+
+    while todo:
+        ast_node = popleft()
+
+        for field_name in ast_node._fields:
+            field = getattr(ast_node, field_name, None)
+
+            if isinstance(field, AST):
+                append(field)
+            elif isinstance(field, list):
+                for item in field:
+                    if isinstance(item, AST):
+                        append(item)
+
+        yield ast_node
+
+
+class _Collector():
+    """
+    To get all import name or asname and all ast.Call object in a program
+    within one traversal. Only primitives are kept, so the result is cheap
+    to send back from a worker process.
+
+    Attributes:
+        filepath: A string of filepath.
+        imports: A set store all import name or asname in a program.
+        calls: A list store (lineno, names) of every call in traversal order.
+        name_stack: A list of class and function names being visited, the
+                    names of a call are built on it. See names in Node.
+    """
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.imports = set()
+        self.calls = []
+        self.name_stack = []
 
+    def collect(self, ast_node):
+        """
+        Only class or function directly under a module, class or function
+        is pushed to name_stack, the others are walked as plain statements.
+        Statements are walked iteratively, so long expression chains do not
+        hit the recursion limit.
+        """
+        for child_node in ast.iter_child_nodes(ast_node):
+            if type(child_node) in _SCOPE_TYPES:
+                self.name_stack.append(child_node.name)
+                self.collect(child_node)
+                self.name_stack.pop()
+            else:
+                for grandchild_node in _walk(child_node):
+                    grandchild_type = type(grandchild_node)
 
-def get_import_in_program(ast_root_node):
-    """To get all import name or asname in a program."""
-    import_list = []
+                    if grandchild_type is ast.Call:
+                        self.add_call(grandchild_node)
+                    elif grandchild_type in _IMPORT_TYPES:
+                        self.add_import(grandchild_node)
 
-    for child_node in ast.walk(ast_root_node):
-        if isinstance(child_node, ast.Import) or \
-            isinstance(child_node, ast.ImportFrom):
-            for name in child_node.names:
-                import_list.append(name.asname if name.asname else name.name)
+    def add_call(self, ast_node):
+        call_name = Node.get_call_name_in_ast(ast_node.func, self.filepath)
+        self.calls.append((ast_node.lineno, (*self.name_stack, call_name)))
 
-    return import_list
+    def add_import(self, ast_node):
+        for name in ast_node.names:
+            self.imports.add(name.asname if name.asname else name.name)
 
 
-def build_call_in_program(call_nodes, ast_root_node, file, names=[]):
+def build_call_in_program(call_nodes, ast_root_node, file):
     """
-    To get all ast.Call object in a program.
+    To get all import and ast.Call object in a program.
 
     Attributes:
         call_nodes: A dict saves all ast.Call nodes found in program, use call
-                    name as key, same calls' name are stored in a list. 
-                    e.g. {str: list, str: list, ...}
+                    name as key, same calls' name are grouped by File instance
+                    in traversal order and stored in a list.
+                    e.g. {str: {File: list, File: list}, str: {...}, ...}
         ast_root_node: A ast.Module object.
         file: A File instance.
-        names: names is defined in Node.
 
     Returns:
-        Result are stored in call_nodes.
+        Calls are stored in call_nodes, imports are stored in file.import_list.
     """
-    for child_node in ast.iter_child_nodes(ast_root_node):
-        if isinstance(child_node, ast.ClassDef) or \
-            isinstance(child_node, ast.FunctionDef):
-            child_names = names + [child_node.name]
-            build_call_in_program(call_nodes, child_node, file, child_names)
+    collector = _Collector(file.filepath)
+    collector.collect(ast_root_node)
+    file.import_list = frozenset(collector.imports)
+    add_call_in_file(call_nodes, file, collector.calls)
+
+
+def add_call_in_file(call_nodes, file, calls):
+    """
+    To store calls collected from a file into call_nodes.
+
+    Attributes:
+        call_nodes: A dict saves all ast.Call nodes found in program, use call
+                    name as key, same calls' name are grouped by File instance
+                    in traversal order and stored in a list.
+                    e.g. {str: {File: list, File: list}, str: {...}, ...}
+        file: A File instance.
+        calls: A list of (lineno, names), see calls in _Collector.
+    """
+    # Same names repeat across calls and files, interning them saves memory
+    # and makes call_nodes lookup hit on identity.
+    intern = sys.intern
+
+    for lineno, names in calls:
+        call = Node(lineno, tuple(intern(name) for name in names), file)
+
+        file_call_nodes = call_nodes.setdefault(call.call_name, {})
+        file_call_nodes.setdefault(file, []).append(call)
+
+
+def _init_worker(log_level):
+    # spawned workers do not inherit logging config of main process
+    log.basicConfig(level=log_level)
+
+
+def _collect_call_and_import_in_file(filepath):
+    """
+    To parse a file and collect its import and call, it runs in a worker
+    process when files are parsed in parallel. The ast is not cached since
+    a worker can not share it with main process.
+
+    Returns:
+        A tuple of (filepath, imports, calls), imports and calls are None
+        if the file can not be parsed. See _Collector.
+    """
+    ast_root_node = _parse(filepath)
+
+    if not ast_root_node:
+        return filepath, None, None
+
+    collector = _Collector(filepath)
+    collector.collect(ast_root_node)
+
+    return filepath, collector.imports, collector.calls
+
+
+# ProcessPoolExecutor refuses more workers than this on Windows
+_MAX_WINDOWS_JOBS = 61
+
+
+def get_jobs(jobs=None):
+    """
+    To get how many processes are used to parse files.
+
+    Attributes:
+        jobs: A int asked by user, None to use the cpus this process can run
+              on. It respects cpu affinity and container limits where
+              os.sched_getaffinity is available.
+    """
+    if jobs is None:
+        if hasattr(os, 'sched_getaffinity'):
+            jobs = len(os.sched_getaffinity(0))
         else:
-            for grandchild_node in ast.walk(child_node):
-                if isinstance(grandchild_node, ast.Call):
-                    call_name = Node.get_call_name_in_ast(grandchild_node.func, file.filepath)
-                    call = Node(grandchild_node, names + [call_name], file)
+            jobs = os.cpu_count() or 1
 
-                    call_nodes.setdefault(call.get_call_name(), [])
-                    call_nodes[call.get_call_name()].append(call)
+    if sys.platform == 'win32':
+        jobs = min(jobs, _MAX_WINDOWS_JOBS)
 
+    return max(jobs, 1)
 
-def build_call_and_import_in_path(call_nodes, path, root_abs_path):
+
+def build_call_and_import_in_path(call_nodes, path, jobs=1):
     """
     To traverse file in path and get call and import.
 
     Attributes:
         call_nodes: A dict saves all ast.Call nodes found in program, use call
-                    name as key, same calls' name are stored in a list. 
-                    e.g. {str: list, str: list, ...}
+                    name as key, same calls' name are grouped by File instance
+                    in traversal order and stored in a list.
+                    e.g. {str: {File: list, File: list}, str: {...}, ...}
         path: A string of dirpath or filepath.
+        jobs: A int of how many processes are used to parse files, see
+              get_jobs.
 
     Returns:
         Result are stored in call_nodes.
     """
-    if os.path.isdir(path):
-        for child in os.listdir(path):
-            child_path = os.path.join(path, child)
+    filepaths = list(_iter_py_files(path, SKIP))
+    # files already parsed by the function pass are collected from the cache
+    uncached_filepaths = [
+        filepath for filepath in filepaths
+        if os.path.normpath(filepath) not in _parse_cache
+    ]
+
+    jobs = get_jobs(jobs)
+
+    if jobs > 1 and len(uncached_filepaths) > 1:
+        executor = ProcessPoolExecutor(
+            jobs, initializer=_init_worker, initargs=(log.getLogger().level,)
+        )
+        results = executor.map(
+            _collect_call_and_import_in_file, uncached_filepaths, chunksize=32
+        )
+    else:
+        executor = None
+        results = map(_collect_call_and_import_in_file, uncached_filepaths)
+
+    try:
+        # results keep the order of uncached_filepaths, merging them back in
+        # filepaths order keeps call_nodes in traversal order
+        for filepath in filepaths:
+            key = os.path.normpath(filepath)
 
-            if not is_skip(child_path, root_abs_path):
-                build_call_and_import_in_path(call_nodes, child_path, root_abs_path)
-    elif os.path.isfile(path):
-        root, extension = os.path.splitext(path)
+            if key in _parse_cache:
+                # the call pass is the last user, so the tree is released
+                ast_root_node = _parse_cache.pop(key)
 
-        if extension == '.py':
-            with open(path, 'r') as f:
-                try:
-                    ast_root_node = ast.parse(f.read())
-                    file = File(path, get_import_in_program(ast_root_node))
-                    build_call_in_program(call_nodes, ast_root_node, file)
-                except SyntaxError:
-                    log.debug('unparse node')
+                if ast_root_node:
+                    build_call_in_program(call_nodes, ast_root_node, File(filepath))
+            else:
+                _, imports, calls = next(results)
 
+                if imports is not None:
+                    add_call_in_file(call_nodes, File(filepath, imports), calls)
+    finally:
+        if executor:
+            executor.shutdown()
 
-def build_function_in_program(ast_root_node, root_node, file, names=[]):
+
+def build_function_in_program(ast_root_node, root_node, file, names=()):
     """
     To get all ast.FunctionDef object in a program.
 
@@ -277,14 +598,13 @@ def build_function_in_program(ast_root_node, root_node, file, names=[]):
     has_next = False
 
     for child_node in ast.iter_child_nodes(ast_root_node):
-        if isinstance(child_node, ast.ClassDef) or \
-            isinstance(child_node, ast.FunctionDef):
-            child_names = names + [child_node.name]
+        if type(child_node) in _SCOPE_TYPES:
+            child_names = names + (child_node.name,)
             build_function_in_program(child_node, root_node, file, child_names)
             has_next = True
 
     if not has_next:
-        Node(ast_root_node, names, file, parent_node=root_node)
+        Node(getattr(ast_root_node, 'lineno', None), names, file, parent_node=root_node)
 
 
 def build_function_in_path(root_node, path):
@@ -298,19 +618,11 @@ def build_function_in_path(root_node, path):
     Returns:
         The functions found in program are stored as child node of root_node.
     """
-    if os.path.isdir(path):
-        for child in os.listdir(path):
-            build_function_in_path(root_node, os.path.join(path, child))
-    elif os.path.isfile(path):
-        _, extension = os.path.splitext(path)
+    for filepath in _iter_py_files(path):
+        ast_root_node = _load(filepath)
 
-        if extension == '.py':
-            with open(path, 'r') as f:
-                try:
-                    ast_root_node = ast.parse(f.read())
-                    build_function_in_program(ast_root_node, root_node, File(path))
-                except SyntaxError:
-                    log.debug('unparse')
+        if ast_root_node:
+            build_function_in_program(ast_root_node, root_node, File(filepath))
 
 
 def is_function_used(parent_node, call_node):
@@ -321,12 +633,11 @@ def is_function_used(parent_node, call_node):
         parent_node: A Node instance.
         call_node: A Node instance.
     """
-    parent_function_name = parent_node.get_outermost_function_name()
-    call_name = call_node.get_call_name()
+    call_name = call_node.call_name
 
-    if call_name == parent_function_name:
+    if call_name == parent_node.outermost_function_name:
         import_list = call_node.file.import_list
-        parent_file_stem_name = get_stem_in_filepath(parent_node.file.filepath)
+        parent_file_stem_name = parent_node.file.stem
 
         if call_name in import_list and \
             len(call_node.names[-1].split('.')) == 1:
@@ -342,59 +653,130 @@ def is_function_used(parent_node, call_node):
     return False
 
 
+def is_file_related(parent_node, file):
+    """
+    To check if calls in a file can be used by parent_node at all, it is
+    necessary for is_function_used so files fail it can be skipped entirely.
+
+    Attributes:
+        parent_node: A Node instance.
+        file: A File instance.
+    """
+    parent_filepath = parent_node.file.filepath
+
+    if parent_filepath == 'root' or parent_filepath == file.filepath:
+        return True
+
+    import_list = file.import_list
+
+    return parent_node.outermost_function_name in import_list or \
+        parent_node.file.stem in import_list
+
+
 def trace_funtion_dependency(call_nodes, parent_node):
     """
     To trace where a function is used and also where its child function is used.
     
     Attributes:
         call_nodes: A dict saves all ast.Call nodes found in program, use call
-                    name as key, same calls' name are stored in a list. 
-                    e.g. {str: list, str: list, ...}
+                    name as key, same calls' name are grouped by File instance
+                    in traversal order and stored in a list.
+                    e.g. {str: {File: list, File: list}, str: {...}, ...}
         parent_node: A Node instance is used to search in call_nodes.
 
     Returns:
         If parent_node is called, the call_node call parent_node will be stored
-        as child node of parent_node.
+        as child node of parent_node. The number of call nodes stored under
+        parent_node is returned, so the tree need not be walked to count it.
     """
-    call_nodes_is_used = []
-    parent_function_name = parent_node.get_outermost_function_name()
+    used_count = 0
+
+    # Nodes are traced depth first like a recursion would do, since a call
+    # node is claimed by the first parent found it. The explicit stack keeps
+    # deep call chains away from the recursion limit.
+    stack = [parent_node]
+
+    while stack:
+        parent_node = stack.pop()
+        parent_function_name = parent_node.outermost_function_name
+        file_call_nodes = call_nodes.get(parent_function_name, {})
+
+        for file, candidate_call_nodes in file_call_nodes.items():
+            if not candidate_call_nodes or not is_file_related(parent_node, file):
+                continue
+
+            call_nodes_not_used = []
 
-    for call_node in call_nodes.get(parent_function_name, []):
-        if is_function_used(parent_node, call_node):
-            call_node.parent_node = parent_node
-            parent_node.child_nodes.append(call_node)
+            for call_node in candidate_call_nodes:
+                if is_function_used(parent_node, call_node):
+                    call_node.parent_node = parent_node
+                    parent_node.child_nodes.append(call_node)
+                    used_count += 1
+                else:
+                    call_nodes_not_used.append(call_node)
 
-            call_nodes_is_used.append(call_node)
+            file_call_nodes[file] = call_nodes_not_used
 
-    for call_node in call_nodes_is_used:
-        call_nodes[parent_function_name].remove(call_node)
+        stack.extend(reversed(parent_node.child_nodes))
 
-    for child_node in parent_node.child_nodes:
-        trace_funtion_dependency(call_nodes, child_node)
+    return used_count
 
 
-def count_child_nodes_len(parent_node):
-    len = 0
+def dump_node_tree(root_node, fp, indent=None):
+    """
+    To write a Node tree into fp in the same json format as json.dump with
+    the same indent, e.g. {filepath, lineno, name, child_nodes}. The tree
+    is walked with an explicit stack, so deep trees do not hit the recursion
+    limit, and json.dumps only encodes the scalar fields.
+
+    Attributes:
+        root_node: A Node instance.
+        fp: A file-like object to write.
+        indent: A int of indent, None to write without indent and spaces.
+    """
+    if indent is None:
+        item_separator, key_separator = ',', ':'
+    else:
+        item_separator, key_separator = ',', ': '
 
-    for child_node in parent_node.child_nodes:
-        len += 1
-        len += count_child_nodes_len(child_node)
+    def newline(level):
+        return '' if indent is None else '\n' + ' ' * (indent * level)
 
-    return len
+    # an item is a Node to write with its level, or a str of brackets and
+    # separators to write after the child nodes before it
+    stack = [(root_node, 0)]
 
+    while stack:
+        item = stack.pop()
 
-def convert_node_tree_into_dict(root_node):
-    nodes_dict = {
-        'filepath': root_node.file.filepath,
-        'lineno': root_node.node.lineno if root_node.node else None,
-        'name': ', '.join(root_node.names),
-        'child_nodes': []
-    }
+        if isinstance(item, str):
+            fp.write(item)
+            continue
 
-    for child_node in root_node.child_nodes:
-        nodes_dict['child_nodes'].append(convert_node_tree_into_dict(child_node))
+        node, level = item
+        field_newline = newline(level + 1)
+        fp.write(
+            '{' + field_newline +
+            '"filepath"' + key_separator + json.dumps(node.file.filepath) +
+            item_separator + field_newline +
+            '"lineno"' + key_separator + json.dumps(node.lineno) +
+            item_separator + field_newline +
+            '"name"' + key_separator + json.dumps(', '.join(node.names)) +
+            item_separator + field_newline +
+            '"child_nodes"' + key_separator
+        )
 
-    return nodes_dict
+        if not node.child_nodes:
+            fp.write('[]' + newline(level) + '}')
+            continue
+
+        fp.write('[')
+        stack.append(field_newline + ']' + newline(level) + '}')
+        child_newline = newline(level + 2)
+
+        for index in range(len(node.child_nodes) - 1, -1, -1):
+            stack.append((node.child_nodes[index], level + 2))
+            stack.append((item_separator if index else '') + child_newline)
 
 
 def main():
@@ -405,7 +787,15 @@ def main():
     )
     parser.add_argument('--json', help='output as json format', action='store_true')
     parser.add_argument(
-        '--skip', nargs='*', type=str, default=[], help='dirs/files do not want to be traced'
+        '--json-compact', help='output as json format without indent and spaces', action='store_true'
+    )
+    parser.add_argument(
+        '--skip', nargs='*', type=str, default=[], help='dirs/files relative to path do not want to be traced'
+    )
+
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=None,
+        help='number of processes to parse files, default is usable cpu count'
     )
 
     group = parser.add_mutually_exclusive_group()
@@ -421,33 +811,36 @@ def main():
 
     if args.skip:
         global SKIP
-        SKIP += args.skip
+        SKIP = get_skip_prefixes(args.skip)
+
+    if args.function:
+        root_node = Node(None, (args.function,), File('root'))
+    elif args.module:
+        # functions are built first so the call pass can reuse the cached ast
+        root_node = Node(None, ('root',), File(args.module))
+        build_function_in_path(root_node, root_node.file.filepath)
 
     call_nodes = {}
-    build_call_and_import_in_path(call_nodes, args.path, os.path.abspath(args.path))
+    build_call_and_import_in_path(call_nodes, args.path, args.jobs)
 
     if args.function:
-        root_node = Node(None, [args.function], File('root'))
-        trace_funtion_dependency(call_nodes, root_node)
+        used_count = trace_funtion_dependency(call_nodes, root_node)
     elif args.module:
-        root_node = Node(None, ['root'], File(args.module))
-        build_function_in_path(root_node, root_node.file.filepath)
+        # functions of the module themselves are not counted
+        used_count = 0
         for child_node in root_node.child_nodes:
-            trace_funtion_dependency(call_nodes, child_node)
+            used_count += trace_funtion_dependency(call_nodes, child_node)
+
+    if args.json or args.json_compact:
+        # written node by node instead of building the whole string
+        dump_node_tree(root_node, sys.stdout, None if args.json_compact else 4)
 
-    if args.json:
-        nodes_dict = convert_node_tree_into_dict(root_node)
-        print(json.dumps(nodes_dict, indent=4))
+        sys.stdout.write('\n')
     else:
         print('root, ' + ', '.join(root_node.names))
         print(Node.get_tree(root_node))
 
-    if args.function:
-        print('Total target function is used: ' + \
-                str(count_child_nodes_len(root_node)))
-    elif args.module:
-        print('Total target function is used: ' + \
-                str(count_child_nodes_len(root_node)-len(root_node.child_nodes)))
+    print('Total target function is used: ' + str(used_count))
 
 
 if __name__ == '__main__':